@@ -1,184 +1,270 @@
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import lxml.etree
+import lxml.html
 import re
+import string
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from rapidfuzz import fuzz
+from rapidfuzz.distance import Levenshtein
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
 from datetime import datetime
 
 UFC_event_number = 324
 output_file = f"ufc_{UFC_event_number}_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.xlsx"
 
+# Shared HTTP session so repeated requests reuse pooled keep-alive connections
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=20,
+    # raise_on_status=False hands back the last error response instead of raising RetryError
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504], raise_on_status=False),
+))
+SESSION.headers.update({
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+})
+
+# A cleaned fighter name with the lowercase/split forms used for matching precomputed
+Candidate = namedtuple('Candidate', 'name lower words surname')
+
+# Pattern to match fighter names with "vs" between them
+# Handles names with multiple words, hyphens, apostrophes, and rankings
+_FIGHT_RE = re.compile(r'\b([A-Z][a-zA-Z\s\-\']{2,50})\s+vs\s+([A-Z][a-zA-Z\s\-\']{2,50})\b')
+
+# Fight card listing markup: one block per bout with a red and a blue corner name
+_FIGHT_LISTING_XPATH = '//div[contains(concat(" ", normalize-space(@class), " "), " c-listing-fight ")]'
+_RED_CORNER_XPATH = './/*[contains(@class, "c-listing-fight__corner-name--red")]'
+_BLUE_CORNER_XPATH = './/*[contains(@class, "c-listing-fight__corner-name--blue")]'
+
+# Regexes used to clean and validate fighter names, compiled once at import
+_WS_RE = re.compile(r'\s+')
+_RANK_RE = re.compile(r'^#\d+\s+')
+_CHAMP_RE = re.compile(r'^C\s+')
+
+# Keywords to remove from the beginning/end (case insensitive). Each keyword is
+# optional and tried once, in the order the names were originally cleaned in
+# (prefixes left to right; suffixes are stripped from the end, so the last keyword
+# tried is leftmost), so only what that one-pass cleanup removed is stripped
+_PREFIX_RE = re.compile(
+    r'^(?:Live now\s+)?(?:Live\s+)?(?:Live now\s+)?(?:Live\s+)?'
+    r'(?:Card\s+)?(?:Method\s+)?(?:Main Card\s+)?(?:Main\s+)?',
+    re.I,
+)
+_SUFFIX_RE = re.compile(
+    r'(?:\s+now)?(?:\s+Live)?(?:\s+Live now)?(?:\s+Follow)?(?:\s+Follow live)?'
+    r'(?:\s+Time)?(?:\s+Round Time)?(?:\s+Round)?$',
+    re.I,
+)
+
+# Lowercase first/last words of the keywords above, for a cheap startswith/endswith screen
+_PREFIX_WORDS = ('live', 'main', 'method', 'card')
+_SUFFIX_WORDS = ('round', 'time', 'live', 'follow', 'now')
+
+# Candidate names matching this are not fighters (labels, countries, weight classes)
+_EXCLUDE_RE = re.compile(
+    r'^(?:vs|odds|Flag'
+    r'|United States|England|Brazil|China|Russia|Dominican Republic|Lithuania|Cameroon)$'
+    r'|.*(?:Title|Bout|Interim|Women|Lightweight|Bantamweight|Heavyweight|Featherweight|Light Heavyweight|Middleweight|Flyweight|Fight Card)',
+    re.I,
+)
+
+# Leftover page words that mark a less clean version of a pair
+_UNWANTED_RE = re.compile(r'\b(?:live|round|method|card|follow|time)\b', re.I)
+
+# Deletion table for characters allowed in a name: letters, spaces, hyphens and apostrophes
+_NAME_CHARS_TABLE = str.maketrans('', '', string.ascii_letters + " -'")
+
+# Pure string function; the "vs" regex yields the same raw names many times per page
+@lru_cache(maxsize=4096)
 def clean_fighter_name(name):
     """Clean fighter name by removing unwanted keywords and prefixes"""
     # Remove extra whitespace
-    name = re.sub(r'\s+', ' ', name.strip())
+    name = _WS_RE.sub(' ', name.strip())
+    
+    # Most names carry no ranking, champion or keyword noise; skip the regexes for those
+    lower = name.lower()
+    if not (name.startswith(('#', 'C ')) or lower.startswith(_PREFIX_WORDS) or lower.endswith(_SUFFIX_WORDS)):
+        return name
     
     # Remove ranking numbers if present (e.g., "#4 Justin Gaethje" -> "Justin Gaethje")
-    name = re.sub(r'^#\d+\s+', '', name)
+    name = _RANK_RE.sub('', name)
     
     # Remove "C " prefix (champion indicator)
-    name = re.sub(r'^C\s+', '', name)
-    
-    # Keywords to remove from the beginning
-    prefix_keywords = ['Live now', 'Live', 'LIVE NOW', 'LIVE', 'Card', 'Method', 'Main Card', 'Main']
-    for keyword in prefix_keywords:
-        # Remove keyword at the start (case insensitive)
-        name = re.sub(r'^' + re.escape(keyword) + r'\s+', '', name, flags=re.I)
+    name = _CHAMP_RE.sub('', name)
     
-    # Keywords to remove from the end
-    suffix_keywords = ['Round', 'Round Time', 'Time', 'Follow live', 'Follow', 'LIVE NOW', 'LIVE', 'now']
-    for keyword in suffix_keywords:
-        # Remove keyword at the end (case insensitive)
-        name = re.sub(r'\s+' + re.escape(keyword) + r'$', '', name, flags=re.I)
+    # Remove keywords at the start and end
+    name = _PREFIX_RE.sub('', name)
+    name = _SUFFIX_RE.sub('', name)
     
     # Clean up any remaining extra whitespace
-    name = re.sub(r'\s+', ' ', name.strip())
+    name = _WS_RE.sub(' ', name.strip())
     
     return name
 
-def normalize_name_for_matching(name):
-    """Normalize name for comparison - get last name and optionally first name"""
-    # Split into words and get the last word (surname)
+def has_valid_name_chars(name):
+    """Check that a cleaned name is capitalised and uses only allowed characters"""
+    # Deleting every allowed character must leave nothing behind
+    return bool(name) and name[0] in string.ascii_uppercase and not name.translate(_NAME_CHARS_TABLE)
+
+def make_candidate(name):
+    """Build a Candidate with the lowercase forms of a cleaned name computed once"""
     words = name.split()
-    if len(words) >= 1:
-        return words[-1].lower()  # Return last name in lowercase
-    return name.lower()
-
-def names_match(name1, name2):
-    """Check if two names refer to the same fighter"""
-    name1_lower = name1.lower()
-    name2_lower = name2.lower()
-    
-    # Exact match
-    if name1_lower == name2_lower:
-        return True
-    
-    # One name contains the other (e.g., "Gaethje" in "Justin Gaethje")
-    if name1_lower in name2_lower or name2_lower in name1_lower:
-        # But make sure it's not just a partial word match
-        # Check if the shorter name is the last name of the longer name
-        shorter = name1 if len(name1) < len(name2) else name2
-        longer = name2 if len(name1) < len(name2) else name1
-        
-        shorter_words = shorter.lower().split()
-        longer_words = longer.lower().split()
-        
-        # If shorter name's last word matches longer name's last word
-        if shorter_words and longer_words and shorter_words[-1] == longer_words[-1]:
-            return True
+    # The surname is the last word, in lowercase, taken from the words already split
+    surname = words[-1].lower() if words else name.lower()
+    return Candidate(name, name.lower(), words, surname)
+
+def names_match(candidate1, candidate2):
+    """Check if two candidates refer to the same fighter"""
+    # Surnames more than 2 edits apart can't be the same fighter; score_cutoff lets
+    # the distance computation stop as soon as that bound is exceeded
+    if Levenshtein.distance(candidate1.surname, candidate2.surname, score_cutoff=2) > 2:
+        return False
     
-    return False
+    # token_set_ratio scores 100 for an exact match and when one name's words are
+    # all contained in the other's (e.g., "Gaethje" in "Justin Gaethje"). On its own
+    # it would also match a bare first name ("Justin" vs "Justin Gaethje"); the
+    # surname check above is what rules that out
+    return fuzz.token_set_ratio(candidate1.lower, candidate2.lower, processor=None, score_cutoff=90) >= 90
 
-def get_fighter_pairs_from_ufc_event(url):
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-    }
-    response = requests.get(url, headers=headers)
-    soup = BeautifulSoup(response.text, 'html.parser')
+def pair_quality(candidate1, candidate2):
+    """Rank two versions of the same pair; higher tuples are the better version"""
+    # Prefer cleaner versions (no unwanted words), then more complete (more words), then longer
+    has_unwanted = bool(_UNWANTED_RE.search(candidate1.name) or _UNWANTED_RE.search(candidate2.name))
+    words = len(candidate1.words) + len(candidate2.words)
+    total_len = len(candidate1.name) + len(candidate2.name)
+    return (not has_unwanted, words, total_len)
 
-    # Extract text content and find "Name vs Name" patterns
-    text_content = soup.get_text(separator=" ")
+def get_fighter_pairs_from_fight_listing(doc):
+    """Read fighter pairs from the fight card listing markup (red/blue corner names)"""
+    fight_pairs = []
+    seen_pairs = set()
+    
+    # Each bout is a "c-listing-fight" block holding one corner name per side
+    for fight in doc.xpath(_FIGHT_LISTING_XPATH):
+        red = fight.xpath(_RED_CORNER_XPATH)
+        blue = fight.xpath(_BLUE_CORNER_XPATH)
+        if not (red and blue):
+            continue
+        
+        # Given and family names sit in separate spans, so join the text nodes with a space
+        fighter1 = _WS_RE.sub(' ', " ".join(red[0].xpath('.//text()')).strip())
+        fighter2 = _WS_RE.sub(' ', " ".join(blue[0].xpath('.//text()')).strip())
+        
+        # The same bout can appear more than once on the page
+        if fighter1 and fighter2 and (fighter1, fighter2) not in seen_pairs:
+            seen_pairs.add((fighter1, fighter2))
+            fight_pairs.append((fighter1, fighter2))
     
-    # Pattern to match fighter names with "vs" between them
-    # Handles names with multiple words, hyphens, apostrophes, and rankings
-    pattern = re.compile(r'\b([A-Z][a-zA-Z\s\-\']{2,50})\s+vs\s+([A-Z][a-zA-Z\s\-\']{2,50})\b')
-    matches = pattern.findall(text_content)
+    return fight_pairs
+
+def get_fighter_pairs_from_page_text(doc):
+    """Find fighter pairs by searching the page text for "Name vs Name" patterns"""
+    # Extract text content (skipping scripts/styles) and find "Name vs Name" patterns
+    text_content = " ".join(doc.xpath('//text()[not(ancestor::script) and not(ancestor::style)]'))
     
     # Use dictionary to store best version of each pair (prefer cleaner, longer names)
     seen_pairs = {}
     
-    for match in matches:
-        fighter1_raw = match[0].strip()
-        fighter2_raw = match[1].strip()
+    # Iterate lazily so the full list of raw matches is never built
+    for match in _FIGHT_RE.finditer(text_content):
+        fighter1_raw = match.group(1).strip()
+        fighter2_raw = match.group(2).strip()
         
         # Clean the names
         fighter1 = clean_fighter_name(fighter1_raw)
         fighter2 = clean_fighter_name(fighter2_raw)
         
-        # Filter out invalid names
-        exclude_patterns = [
-            r'^(vs|odds|Flag)$',
-            r'^(United States|England|Brazil|China|Russia|Dominican Republic|Lithuania|Cameroon)$',
-            r'.*(Title|Bout|Interim|Women|Lightweight|Bantamweight|Heavyweight|Featherweight|Light Heavyweight|Middleweight|Flyweight|Fight Card).*',
-        ]
-        
         # Check if names are valid (must be proper names, not too short/long)
         valid1 = (len(fighter1) >= 5 and len(fighter1) <= 40 and 
-                 not any(re.match(pattern, fighter1, re.I) for pattern in exclude_patterns) and
-                 re.match(r'^[A-Z][a-zA-Z\s\-\']+$', fighter1))
+                 not _EXCLUDE_RE.match(fighter1) and
+                 has_valid_name_chars(fighter1))
         
         valid2 = (len(fighter2) >= 5 and len(fighter2) <= 40 and 
-                 not any(re.match(pattern, fighter2, re.I) for pattern in exclude_patterns) and
-                 re.match(r'^[A-Z][a-zA-Z\s\-\']+$', fighter2))
+                 not _EXCLUDE_RE.match(fighter2) and
+                 has_valid_name_chars(fighter2))
         
         if valid1 and valid2:
-            # Check if this pair matches any existing pair (handles partial name matches)
-            matched_key = None
-            for existing_key, existing_pair in seen_pairs.items():
-                existing_f1, existing_f2 = existing_pair
-                # Check if fighters match (handles "Gaethje" vs "Justin Gaethje" cases)
-                if (names_match(fighter1, existing_f1) and names_match(fighter2, existing_f2)) or \
-                   (names_match(fighter1, existing_f2) and names_match(fighter2, existing_f1)):
-                    matched_key = existing_key
-                    break
+            candidate1 = make_candidate(fighter1)
+            candidate2 = make_candidate(fighter2)
             
-            if matched_key is None:
+            # Index pairs by their sorted surnames; a fighter can only match an
+            # existing one with the same surname, so no scan over all pairs is needed
+            pair_key = tuple(sorted([candidate1.surname, candidate2.surname]))
+            existing = seen_pairs.get(pair_key)
+            
+            # Check if fighters match (handles "Gaethje" vs "Justin Gaethje" cases)
+            if existing is None or not (
+                (names_match(candidate1, existing[0]) and names_match(candidate2, existing[1])) or
+                (names_match(candidate1, existing[1]) and names_match(candidate2, existing[0]))
+            ):
                 # New pair, add it with normalized key
-                pair_key = tuple(sorted([normalize_name_for_matching(fighter1), normalize_name_for_matching(fighter2)]))
-                seen_pairs[pair_key] = (fighter1, fighter2)
+                seen_pairs[pair_key] = (candidate1, candidate2)
             else:
                 # This pair matches an existing one, prefer the better version
-                existing = seen_pairs[matched_key]
-                current_total_len = len(fighter1) + len(fighter2)
-                existing_total_len = len(existing[0]) + len(existing[1])
-                
-                # Prefer versions with full names (more words = more complete)
-                current_words = len(fighter1.split()) + len(fighter2.split())
-                existing_words = len(existing[0].split()) + len(existing[1].split())
-                
-                # Also prefer versions without common unwanted words
-                current_has_unwanted = any(word in fighter1.lower() or word in fighter2.lower() 
-                                          for word in ['live', 'round', 'method', 'card', 'follow', 'time'])
-                existing_has_unwanted = any(word in existing[0].lower() or word in existing[1].lower() 
-                                           for word in ['live', 'round', 'method', 'card', 'follow', 'time'])
-                
-                # Prefer cleaner version (no unwanted words), or more complete (more words), or longer
-                if not current_has_unwanted and existing_has_unwanted:
-                    seen_pairs[matched_key] = (fighter1, fighter2)
-                elif current_has_unwanted == existing_has_unwanted:
-                    if current_words > existing_words:
-                        seen_pairs[matched_key] = (fighter1, fighter2)
-                    elif current_words == existing_words and current_total_len > existing_total_len:
-                        seen_pairs[matched_key] = (fighter1, fighter2)
-    
-    # Convert dictionary values to list
-    fight_pairs = list(seen_pairs.values())
+                if pair_quality(candidate1, candidate2) > pair_quality(*existing):
+                    seen_pairs[pair_key] = (candidate1, candidate2)
+    
+    # Convert dictionary values to a list of name pairs
+    fight_pairs = [(candidate1.name, candidate2.name) for candidate1, candidate2 in seen_pairs.values()]
+    
+    return fight_pairs
+
+def get_fighter_pairs_from_ufc_event(url):
+    response = SESSION.get(url, timeout=10)
+    # Parse the raw bytes with lxml. If the HTTP Content-Type header names a charset, use
+    # it, since lxml only looks for <meta charset> and would otherwise fall back to Latin-1
+    parser = None
+    if 'charset=' in response.headers.get('Content-Type', '').lower():
+        parser = lxml.html.HTMLParser(encoding=response.encoding)
+    try:
+        doc = lxml.html.fromstring(response.content, parser=parser)
+    except lxml.etree.ParserError:
+        # Nothing lxml can build a document from (empty body, only a comment, ...)
+        return []
+    
+    # Prefer the structured fight card; only fall back to the whole-page text
+    # heuristics if the listing markup isn't there (e.g., the layout changed)
+    fight_pairs = get_fighter_pairs_from_fight_listing(doc)
+    if not fight_pairs:
+        fight_pairs = get_fighter_pairs_from_page_text(doc)
     
     return fight_pairs
 
+def get_fighter_pairs_from_ufc_events(urls, max_workers=8):
+    """Scrape several event pages concurrently, returning one list of pairs per URL"""
+    # Fetching is I/O-bound, so threads overlap the network waits while
+    # sharing the pooled SESSION connections (keep max_workers <= pool_maxsize)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(get_fighter_pairs_from_ufc_event, urls))
+
 def create_excel_file(fight_pairs, filename="ufc_fights.xlsx"):
     """Create an Excel file with fighter pairs"""
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Fight Card"
+    # Write-only mode streams rows out instead of keeping every cell in memory
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Fight Card")
     
-    # Set headers
-    ws['A1'] = "fighter 1"
-    ws['B1'] = "fighter 2"
+    # Set column widths (must happen before any rows are written)
+    ws.column_dimensions['A'].width = 30
+    ws.column_dimensions['B'].width = 30
     
-    # Make headers bold
-    from openpyxl.styles import Font
+    # Set headers and make them bold
     bold_font = Font(bold=True)
-    ws['A1'].font = bold_font
-    ws['B1'].font = bold_font
+    headers = []
+    for title in ("fighter 1", "fighter 2"):
+        cell = WriteOnlyCell(ws, value=title)
+        cell.font = bold_font
+        headers.append(cell)
+    ws.append(headers)
     
     # Add fighter pairs
-    for row_idx, (fighter1, fighter2) in enumerate(fight_pairs, start=2):
-        ws[f'A{row_idx}'] = fighter1
-        ws[f'B{row_idx}'] = fighter2
-    
-    # Auto-adjust column widths
-    ws.column_dimensions['A'].width = 30
-    ws.column_dimensions['B'].width = 30
+    for fight_pair in fight_pairs:
+        ws.append(fight_pair)
     
     # Save the file
     wb.save(filename)